@@ -1,8 +1,37 @@
 """A module for automatic test cases and writing test boilerplate
 """
 
-import re
-import traceback
+import functools
+import importlib
+import string
+
+# Characters kept when converting a test case description to a test function name (i.e. [a-zA-Z0-9_])
+_FUNCTION_NAME_CHARACTERS = frozenset(string.ascii_letters + string.digits + '_')
+
+
+class _FunctionNameTranslationTable(dict):
+    """A str.translate() table which deletes all characters not in _FUNCTION_NAME_CHARACTERS
+
+    Characters are looked up (and cached) on first use, so non-ASCII characters are also deleted.
+    """
+
+    def __missing__(self, ordinal):
+        self[ordinal] = ordinal if chr(ordinal) in _FUNCTION_NAME_CHARACTERS else None
+        return self[ordinal]
+
+
+_FUNCTION_NAME_TRANSLATION_TABLE = _FunctionNameTranslationTable()
+
+
+@functools.lru_cache(maxsize=1)
+def _get_pyperclip():
+    """Returns the pyperclip module if available (for automatic copying of results to the clipboard), else None"""
+    try:
+        import pyperclip
+        return pyperclip
+    except ImportError:
+        return None
+
 
 def create_tests_from_test_cases(
         test_module:str,
@@ -28,9 +57,7 @@ def create_tests_from_test_cases(
     :rtype: None
 
     ## Warning
-    This function uses:
-     - exec() on test_module_path and test_function_name
-     - eval() on test_function_name and your args and kwargs.
+    This function imports test_module and calls test_function_name with your args and kwargs.
      Do not pass unsafe code through these parameters.
 
     ## Rationale
@@ -148,37 +175,34 @@ def create_tests_from_test_cases(
     """
 
     # Import the module and function to be tested
+    test_function = None
     try:
-        # TODO Fix this import kluge
-        exec(f'from {test_module} import {test_function_name}')
-    except ImportError:
+        test_function = getattr(importlib.import_module(test_module), test_function_name)
+    except (ImportError, AttributeError):
         print(f'Sorry, the test_module_path \'{test_module}\' and test_function_name {test_function_name} '
               f'could not be imported')
 
-    # Attempt to load pyperclip from the environment (for automatic copying of results to the clipboard)
-    try:
-        import pyperclip
-        use_pyperclip = True
-    except ImportError:
-        use_pyperclip = False
-
     # To avoid copy/paste errors and duplicated tests, track:
         # 1. Whether descriptions are reused (which would create a duplicate test functions which won't run)
-    descriptions_already_used = []
+    descriptions_already_used = set()
 
     # 2. Whether an args/kwargs combo has been reused accidentally
-    args_and_kwargs_already_used = []
+    args_and_kwargs_already_used = set()
+
+    # The args, kwargs and result of calls already made (keyed as in args_and_kwargs_already_used), so that a reused
+    # args/kwargs combo doesn't call the test function again
+    results_cache = {}
 
     # Render the class name to be used when creating a test function for this case
     function_name_in_upper_camel_case = ''.join([word[0:1].upper() + word[1:] for word in
                                                  test_function_name.lower().split('_')])
 
     # Store output for copying to clipboard (if pyperclip installed)
-    output = f'class Test{function_name_in_upper_camel_case}(unittest.TestCase):\n\n'
-    print (output)
+    output_parts = [f'class Test{function_name_in_upper_camel_case}(unittest.TestCase):\n\n']
+    print (output_parts[0])
 
     for test_case in test_cases:
-        output_for_test_case = ''
+        output_for_test_case_parts = []
 
         # Get metadata
         description = test_case.get('description')
@@ -188,29 +212,41 @@ def create_tests_from_test_cases(
             # This is not a test, it's a comment to be reposted to the output
             output_for_test_case = f'    # {comment}\n\n'
             print (output_for_test_case)
-            output += output_for_test_case
+            output_parts.append(output_for_test_case)
             continue
 
-        # Get and check args
+        # Get and check args (which must be wrapped in a list or tuple, e.g. [arg1, arg2])
         args_rendered = ''
+        call_args = []
         args = test_case.get('args')
-        if number_of_args == 0:
+        if args is None:
+            args = []
+        args_wrapped = isinstance(args, (list, tuple))
+        if not args_wrapped:
+            # Rendered for the output only: the test function won't be called (see below)
+            args_rendered = repr(args)
+        elif number_of_args == 0:
             if args:
-                output_for_test_case += ('# !!! number_of_args == 0 but args were provided !!!')
+                output_for_test_case_parts.append('# !!! number_of_args == 0 but args were provided !!!\n')
         elif number_of_args == 1:
-            args_rendered = str(args)
+            if len(args) != 1:
+                output_for_test_case_parts.append(f'# !!! number_of_args == 1 but {len(args)} args were provided !!!\n')
+            if args:
+                args_rendered = repr(args[0])
+                call_args = [args[0]]
         elif number_of_args > 1:
-            # The args must be in an iterable
-            args_as_strings = [str(arg) for arg in args]
-            if number_of_args != len(args_as_strings):
-                output_for_test_case += (f'# !!! number_of_args == {number_of_args} but {len(args_as_strings)} '
-                                         'args were provided !!!')
-            args_rendered = ', '.join(args_as_strings)
+            if number_of_args != len(args):
+                output_for_test_case_parts.append(f'# !!! number_of_args == {number_of_args} but {len(args)} '
+                                                  'args were provided !!!\n')
+            # Use repr() (rather than str()) so that the rendered args are valid Python
+            args_rendered = ', '.join(repr(arg) for arg in args)
+            call_args = list(args)
 
         # Get kwargs
         kwargs = test_case.get('kwargs')
+        call_kwargs = kwargs or {}
         if kwargs:
-            kwargs_rendered = ', '.join([f'{k}={v}' for k, v in kwargs.items()])
+            kwargs_rendered = ', '.join([f'{k}={v!r}' for k, v in kwargs.items()])
         else:
             # No printed warning for missing kwags
             kwargs_rendered = ''
@@ -223,96 +259,112 @@ def create_tests_from_test_cases(
             expect_key_present = True
 
         # Create the normalized description text
-        description_as_function_name = re.sub('[^a-zA-Z0-9_]', '', description.replace(" ", "_").lower())
-        if description_as_function_name not in descriptions_already_used:
-            descriptions_already_used.append(description_as_function_name)
+        description_as_function_name = description.replace(" ", "_").lower().translate(_FUNCTION_NAME_TRANSLATION_TABLE)
+        if description_as_function_name in descriptions_already_used:
+            output_for_test_case_parts.append(f'# !!! THIS DESCRIPTION (AND TEST FUNCTION NAME) HAS ALREADY BEEN USED !!!\n')
         else:
-           output_for_test_case += f'# !!! THIS DESCRIPTION (AND TEST FUNCTION NAME) HAS ALREADY BEEN USED !!!\n'
+            descriptions_already_used.add(description_as_function_name)
 
-        # Check for copied args and kargs
-        args_and_kwargs = args_rendered + kwargs_rendered
-        if args_and_kwargs not in args_and_kwargs_already_used:
-            args_and_kwargs_already_used.append(args_and_kwargs)
+        # Check for copied args and kargs (args and kwargs values may be unhashable, so use their repr())
+        args_and_kwargs = (repr(args), tuple(sorted((k, repr(v)) for k, v in kwargs.items())) if kwargs else ())
+        if args_and_kwargs in args_and_kwargs_already_used:
+            output_for_test_case_parts.append(f'# !!! THIS SET OF ARGS AND KWARGS HAS ALREADY BEEN USED !!!\n')
         else:
-            output_for_test_case += f'# !!! THIS SET OF ARGS AND KWARGS HAS ALREADY BEEN USED !!!\n'
+            args_and_kwargs_already_used.add(args_and_kwargs)
 
-        # Render and eval() the code string
+        # Render the code string (for the output) and call the test function
         code = ''
         try:
             if args_rendered and kwargs_rendered:
                 code = f'{test_function_name}({args_rendered}, {kwargs_rendered})'
-                result = eval(code)
             elif args_rendered:
                 code = f'{test_function_name}({args_rendered})'
-                result = eval(code)
             elif kwargs_rendered:
                 code = f'{test_function_name}({kwargs_rendered})'
-                result = eval(code)
             else:
                 code = f'{test_function_name}()'
-                result = eval(code)
-                output_for_test_case += '# !!! There were no args or kwargs - is that what you wanted? !!!\n'
+                output_for_test_case_parts.append('# !!! There were no args or kwargs - is that what you wanted? !!!\n')
+
+            if not args_wrapped:
+                raise TypeError(f'args must be wrapped in a list (e.g. [arg1, arg2]) but {args!r} was provided')
+
+            # Only reuse a cached result if the args and kwargs are equal (different values can have the same repr())
+            result_is_cached = False
+            if args_and_kwargs in results_cache:
+                cached_args, cached_kwargs, cached_result = results_cache[args_and_kwargs]
+                try:
+                    result_is_cached = bool(cached_args == args and cached_kwargs == kwargs)
+                except Exception:
+                    # Some values can't be compared with == (e.g. numpy arrays), so call the test function again
+                    pass
+
+            if result_is_cached:
+                result = cached_result
+            else:
+                result = test_function(*call_args, **call_kwargs)
+                results_cache[args_and_kwargs] = (args, kwargs, result)
 
             # Check the result
             if expect_key_present and result == expect:
                 # The result was equal to the value to the 'expect' key in this test case
-                output_for_test_case += f'    def test_{description_as_function_name}(self):\n'
-                output_for_test_case += f'        # {description}\n'
+                output_for_test_case_parts.append(f'    def test_{description_as_function_name}(self):\n')
+                output_for_test_case_parts.append(f'        # {description}\n')
                 if comment:
-                    output_for_test_case += f'        # {comment}\n'
-                if isinstance(result, str):
-                    output_for_test_case += f"        assert {code} == '{result}'\n\n\n"
-                else:
-                    output_for_test_case += f"        assert {code} == {result}\n\n\n"
+                    output_for_test_case_parts.append(f'        # {comment}\n')
+                output_for_test_case_parts.append(f"        assert {code} == {result!r}\n\n\n")
             else:
                 # The result was NOT equal to the value to the 'expect' key in this test case
                 if expect_key_present:
-                    output_for_test_case += f'# !!! TEST FAILED (RESULT <> EXPECT) !!!\n'
-                output_for_test_case += f'# {description}\n'
+                    output_for_test_case_parts.append(f'# !!! TEST FAILED (RESULT <> EXPECT) !!!\n')
+                output_for_test_case_parts.append(f'# {description}\n')
                 if comment:
-                    output_for_test_case += f'        # {comment}\n'
-                if args:
-                    output_for_test_case += f'# args:    {args_rendered}\n'
+                    output_for_test_case_parts.append(f'        # {comment}\n')
+                if args_rendered:
+                    output_for_test_case_parts.append(f'# args:    {args_rendered}\n')
                 if kwargs:
-                    output_for_test_case += f'# kwargs:  {kwargs_rendered}\n'
+                    output_for_test_case_parts.append(f'# kwargs:  {kwargs_rendered}\n')
                 if expect_key_present:
-                    output_for_test_case += f'# expect:  {expect}\n'
+                    output_for_test_case_parts.append(f'# expect:  {expect}\n')
                 else:
-                    output_for_test_case += f'# expect:  [no \'expect\' key in test data]\n'
-                output_for_test_case += f'# result:  {result}\n\n'
+                    output_for_test_case_parts.append(f'# expect:  [no \'expect\' key in test data]\n')
+                output_for_test_case_parts.append(f'# result:  {result}\n\n')
 
             # Print this test case to stdout
+            output_for_test_case = ''.join(output_for_test_case_parts)
             print(output_for_test_case)
             # Add the output for this test case to the overall output (for copying to the clipboard if pyperclip available)
-            output += output_for_test_case
+            output_parts.append(output_for_test_case)
 
         except Exception as e:
             # The test function crashed
-            output_for_test_case += '# !!! EXECUTION ERROR !!!\n'
-            output_for_test_case += f'# {description}\n'
-            output_for_test_case += f'# code:    {code}\n'
+            output_for_test_case_parts.append('# !!! EXECUTION ERROR !!!\n')
+            output_for_test_case_parts.append(f'# {description}\n')
+            output_for_test_case_parts.append(f'# code:    {code}\n')
             if comment:
-                output_for_test_case += f'# {comment}\n'
-            if args:
-               output_for_test_case += f'# args:    {args_rendered}\n'
+                output_for_test_case_parts.append(f'# {comment}\n')
+            if args_rendered:
+               output_for_test_case_parts.append(f'# args:    {args_rendered}\n')
             if kwargs:
-                output_for_test_case += f'# kwargs:  {kwargs_rendered}\n'
+                output_for_test_case_parts.append(f'# kwargs:  {kwargs_rendered}\n')
             if expect_key_present:
-                output_for_test_case += f'# expect:  {expect}\n'
-            output_for_test_case += f'# ERROR:   {str(e)}\n'
+                output_for_test_case_parts.append(f'# expect:  {expect}\n')
+            output_for_test_case_parts.append(f'# ERROR:   {str(e)}\n')
 
             # If requested, let it crash (or add the traceback within Python comments)
             if let_crash == True:
                 raise
             else:
+                import traceback
                 tb = traceback.format_exc()
-                output_for_test_case += "'''\n"
-                output_for_test_case += str(tb)
-                output_for_test_case += "'''\n\n"
+                output_for_test_case_parts.append("'''\n")
+                output_for_test_case_parts.append(str(tb))
+                output_for_test_case_parts.append("'''\n\n")
+            output_for_test_case = ''.join(output_for_test_case_parts)
             print(output_for_test_case)
-            output += output_for_test_case
+            output_parts.append(output_for_test_case)
 
     # Copy all output to the clipboard if pyperclip available
-    if use_pyperclip:
-        pyperclip.copy(output)
+    pyperclip = _get_pyperclip()
+    if pyperclip:
+        pyperclip.copy(''.join(output_parts))
         print('# Results copied to the clipboard (Ctrl-V to paste)')